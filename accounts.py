@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+账号来源与流式执行（公共模块）
+更新时间：2026-10-19
+环境变量：
+<变量名>_FILE   : 账号文件路径，每行一个凭据，设置后优先于同名环境变量
+QL_MMAP         : 为1时以内存映射方式读取账号文件（可选）
+QL_WORKERS      : 并发账号数，默认1（可选）
+QL_QUEUE_SIZE   : 待处理账号队列上限，默认为并发数的4倍（可选）
+QL_RESULT_DIR   : 结果输出目录（不存在时自动创建），设置后逐行写入 <站点>_results.jsonl（可选）
+调度相关变量见 schedule.py
+"""
+import os
+import re
+import json
+import mmap
+import queue
+import time
+import threading
+from itertools import islice
+from schedule import DurationHistory, Scheduler, account_key
+from metrics import metrics
+
+
+class AccountSource:
+    """账号来源：逐个产出凭据，不在内存中保留完整列表"""
+
+    def __init__(self, reader, accept=None):
+        self._reader = reader
+        self._accept = accept
+        self.skipped = 0
+
+    @classmethod
+    def from_env(cls, name, sep=None, accept=None):
+        raw = os.getenv(name, "")
+        pattern = re.compile(sep) if sep else re.compile(r"\r?\n")
+
+        def reader():
+            start = 0
+            for match in pattern.finditer(raw):
+                yield raw[start:match.start()]
+                start = match.end()
+            yield raw[start:]
+        return cls(reader, accept)
+
+    @classmethod
+    def from_file(cls, path, use_mmap=False, accept=None):
+        def reader():
+            with open(path, "rb") as f:
+                if use_mmap and os.fstat(f.fileno()).st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        for line in iter(mm.readline, b""):
+                            yield line.decode("utf-8", "ignore")
+                else:
+                    for line in f:
+                        yield line.decode("utf-8", "ignore")
+        return cls(reader, accept)
+
+    @classmethod
+    def load(cls, name, sep=None, accept=None):
+        """优先读取 <name>_FILE 指向的文件，其次读取环境变量；都未配置时返回None"""
+        path = os.getenv(f"{name}_FILE", "").strip()
+        if path:
+            if not os.path.isfile(path):
+                print(f"❌ 账号文件不存在: {name}_FILE={path}")
+                return None
+            return cls.from_file(path, use_mmap=os.getenv("QL_MMAP") == "1", accept=accept)
+        if os.getenv(name):
+            return cls.from_env(name, sep=sep, accept=accept)
+        return None
+
+    def __iter__(self):
+        for item in self._reader():
+            item = item.strip()
+            if not item:
+                continue
+            if self._accept and not self._accept(item):
+                self.skipped += 1
+                continue
+            yield item
+
+
+class ResultSink:
+    """结果收集：逐条写入文件，仅在内存中保留前若干条用于推送"""
+
+    def __init__(self, path=None, keep=50):
+        self.path = path
+        self.keep = keep
+        self.kept = []
+        self.total = 0
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8") if path else None
+
+    @classmethod
+    def for_site(cls, site, keep=50):
+        directory = os.getenv("QL_RESULT_DIR", "").strip()
+        if not directory:
+            return cls(None, keep)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            return cls(os.path.join(directory, f"{site}_results.jsonl"), keep)
+        except OSError as e:
+            print(f"❌ 结果目录不可用，结果仅输出到控制台: {str(e)}")
+            return cls(None, keep)
+
+    @property
+    def truncated(self):
+        return self.total - len(self.kept)
+
+    def write(self, result):
+        with self._lock:
+            self.total += 1
+            status = result.get("status")
+            self.counts[status] = self.counts.get(status, 0) + 1
+            if len(self.kept) < self.keep:
+                self.kept.append(result)
+            if self._file:
+                self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def run_accounts(source, handler, sink=None, workers=None, queue_size=None, site=None):
+    """
+    通过有界队列把账号分发给工作线程
+    handler(index, credential) 返回结果字典（可为None），结果交给sink
+    指定 site 时按历史耗时分批排序派发，并记录本次各账号耗时
+    返回已处理的账号数
+    """
+    # 并发数与队列上限至少为1，Queue(0) 表示不限长度，会把账号全部载入内存
+    workers = max(1, workers or int(os.getenv("QL_WORKERS", "1") or 1))
+    queue_size = max(1, queue_size or int(os.getenv("QL_QUEUE_SIZE", "0") or 0) or workers * 4)
+    tasks = queue.Queue(maxsize=queue_size)
+    history = DurationHistory.from_env() if site else None
+    scheduler = Scheduler(workers, history) if site else None
+    count = [0]
+    count_lock = threading.Lock()
+
+    def worker():
+        while True:
+            task = tasks.get()
+            if task is None:
+                tasks.task_done()
+                return
+            index, credential = task
+            start = time.monotonic()
+            try:
+                result = handler(index, credential)
+                if sink is not None and result is not None:
+                    sink.write(result)
+            except Exception as e:
+                print(f"❌ 账号{index}处理异常: {str(e)}")
+            finally:
+                if history is not None:
+                    history.record(site, account_key(credential), time.monotonic() - start)
+                with count_lock:
+                    count[0] += 1
+                tasks.task_done()
+
+    run_start = time.monotonic()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    if scheduler is None:
+        for index, credential in enumerate(source, 1):
+            tasks.put((index, credential))
+    else:
+        window = int(os.getenv("QL_SCHEDULE_WINDOW", "256") or 256)
+        accounts = enumerate(source, 1)
+        while True:
+            batch = [(site, credential, index) for index, credential in islice(accounts, window)]
+            if not batch:
+                break
+            for _, credential, index in scheduler.plan(batch):
+                tasks.put((index, credential))
+    for _ in threads:
+        tasks.put(None)
+    metrics.inc("ql_accounts_skipped_total", getattr(source, "skipped", 0))
+    for t in threads:
+        t.join()
+    if scheduler is not None:
+        history.save()
+        if count[0]:
+            print(f"\n📐 预计总耗时 {scheduler.predicted_makespan:.1f} 秒，实际 {time.monotonic() - run_start:.1f} 秒")
+    return count[0]
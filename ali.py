@@ -5,18 +5,92 @@
 更新时间：2024-06-20
 环境变量：
 ALIYUN_TOKENS   : 多个refresh_token用换行分隔
+ALIYUN_TOKENS_FILE : 账号文件，每行一个refresh_token（可选，见accounts.py）
+ALIYUN_CALENDAR_FILE : 当天签到天数缓存文件，默认 aliyun_calendar.json（可选）
 PUSHPLUS_TOKEN  : 推送Token（可选）
 """
 import os
 import time
+import threading
 import uuid
 import hashlib
 import requests
 from datetime import datetime
+from timeouts import timeouts
+from storage import load_json, save_json
+from hedge import hedger
+from metrics import metrics
+from accounts import AccountSource, ResultSink, run_accounts
+
+class SignCalendarCache:
+    """
+    按账号缓存当天已确认的签到后天数，当天再次运行时直接作为比较基准；
+    更早日期的缓存无法排除当天已在其他客户端签到，不能作为基准，读取和保存时都会丢弃；
+    保存时与文件中其他进程的记录合并，没有变化时不写入
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._calendar = self._load()
+        self._changes = {}
+
+    @staticmethod
+    def _today():
+        return datetime.now().strftime("%Y-%m-%d")
+
+    def _load(self):
+        today = self._today()
+        return {
+            key: entry for key, entry in load_json(self.path).items()
+            if isinstance(entry, dict) and entry.get("date") == today and isinstance(entry.get("count"), int)
+        }
+
+    def get(self, key):
+        """返回当天缓存的签到天数，没有当天的缓存时返回None"""
+        with self._lock:
+            entry = self._calendar.get(key)
+            if entry and entry["date"] == self._today():
+                self.hits += 1
+                self.saved += 1
+                return entry["count"]
+            self.misses += 1
+            return None
+
+    def put(self, key, count):
+        entry = {"date": self._today(), "count": count}
+        with self._lock:
+            if self._calendar.get(key) != entry:
+                self._calendar[key] = entry
+                self._changes[key] = entry
+
+    def skipped_status_call(self):
+        with self._lock:
+            self.saved += 1
+
+    def save(self):
+        with self._lock:
+            changes, self._changes = self._changes, {}
+        if not changes:
+            return
+        # 重新读取时已丢弃非当天的记录，文件只保留当天签到过的账号
+        merged = self._load()
+        today = self._today()
+        merged.update((key, entry) for key, entry in changes.items() if entry["date"] == today)
+        save_json(self.path, merged, "签到天数缓存")
+
+    def summary(self):
+        total = self.hits + self.misses
+        return f"签到天数缓存命中 {self.hits}/{total}，节省 {self.saved} 次 sign_in_list 请求"
 
 class AliYunSigner:
-    def __init__(self, refresh_token):
+    def __init__(self, refresh_token, calendar=None):
         self.refresh_token = refresh_token
+        self.calendar = calendar
+        self.account_key = hashlib.sha1(refresh_token.encode()).hexdigest()
         self.session = requests.Session()
         self.device_id = "6dfa3b2c9d4e7f01"
         self._setup_headers()
@@ -36,33 +110,66 @@ class AliYunSigner:
 
     def login(self):
         try:
-            resp = self.session.post(
+            resp = timeouts.request(
+                self.session, "post",
                 "https://auth.aliyundrive.com/v2/account/token",
                 json={
                     "grant_type": "refresh_token",
                     "refresh_token": self.refresh_token,
                     "_signature": self._generate_signature()
                 },
-                timeout=10
+                default=10
             )
             data = resp.json()
             if "access_token" not in data:
                 return False, data.get("message", "未知错误")
             self.session.headers["Authorization"] = f"Bearer {data['access_token']}"
+            if data.get("user_id"):
+                self.account_key = data["user_id"]
             return True, "登录成功"
         except Exception as e:
             return False, f"登录异常：{str(e)}"
 
     def _get_sign_days(self):
+        """查询累计签到天数，请求失败或响应中没有天数时返回None"""
         try:
-            resp = self.session.post(
+            resp = hedger.request(
+                self.session, "post",
                 "https://member.aliyundrive.com/v2/activity/sign_in_list",
                 json={"_rx-s": "mobile", "deviceId": self.device_id},
-                timeout=10
+                default=10
             )
-            return resp.json().get("result", {}).get("signInCount", 0)
+            count = (resp.json().get("result") or {}).get("signInCount")
+            return count if isinstance(count, int) else None
         except:
-            return 0
+            return None
+
+    def _sign_in(self):
+        resp = timeouts.request(
+            self.session, "post",
+            "https://member.aliyundrive.com/v1/activity/sign_in",
+            json={"_rx-s": "mobile"},
+            default=10
+        )
+        return resp.json()
+
+    def _baseline_days(self):
+        """签到前天数：当天已确认过时用缓存，否则请求 sign_in_list"""
+        cached = self.calendar.get(self.account_key) if self.calendar else None
+        if cached is not None:
+            return cached
+        return self._get_sign_days()
+
+    def _signed_days(self, sign):
+        """签到后天数：直接取签到响应中的 signInCount，缺失时才请求 sign_in_list"""
+        if not sign.get("success"):
+            return None
+        count = (sign.get("result") or {}).get("signInCount")
+        if isinstance(count, int):
+            if self.calendar:
+                self.calendar.skipped_status_call()
+            return count
+        return self._get_sign_days()
 
     def process_sign(self):
         result = {
@@ -78,22 +185,21 @@ class AliYunSigner:
             result["status"] = f"❌ 登录失败（{login_msg[:10]}）"
             return result
 
-        # 签到流程
+        # 签到流程：签到前的天数必须先于签到确定，才能区分本次签到与重复签到
         try:
-            original_days = self._get_sign_days()
-            sign_resp = self.session.post(
-                "https://member.aliyundrive.com/v1/activity/sign_in",
-                json={"_rx-s": "mobile"},
-                timeout=10
-            )
+            original_days = self._baseline_days()
+            sign = self._sign_in()
+            updated_days = self._signed_days(sign)
             
-            if sign_resp.json().get("success"):
-                updated_days = self._get_sign_days()
-                result["days"] = updated_days
-                result["status"] = "✅ 签到成功" if updated_days > original_days else "⚠️ 重复签到"
+            if sign.get("success"):
+                result["days"] = updated_days or 0
+                result["status"] = "✅ 签到成功" if (updated_days or 0) > (original_days or 0) else "⚠️ 重复签到"
+                # 只缓存真实取得的天数，查询失败时不能让下次运行以错误的基准比较
+                if self.calendar and updated_days is not None:
+                    self.calendar.put(self.account_key, updated_days)
             else:
                 result["status"] = "⚠️ 签到失败"
-                result["days"] = original_days
+                result["days"] = original_days or 0
                 
         except Exception as e:
             result["status"] = f"❌ 系统异常（{str(e)[:10]}）"
@@ -115,11 +221,19 @@ def push_notification(token, content):
     except:
         return False
 
+def format_result(result):
+    return f"""
+🔔 阿里云签到结果（{result['account']}）
+├ 状态: {result['status']}
+├ 累计: {result['days']}天
+└ 时间: {result['time']}
+""".strip()
+
 def main():
-    tokens = [t.strip() for t in os.getenv("ALIYUN_TOKENS", "").splitlines() if t.strip()]
+    source = AccountSource.load("ALIYUN_TOKENS")
     pushplus_token = os.getenv("PUSHPLUS_TOKEN")
     
-    if not tokens:
+    if source is None:
         print("❌ 请设置环境变量 ALIYUN_TOKENS")
         return
 
@@ -127,40 +241,49 @@ def main():
     print(f"  阿里云盘自动签到  {datetime.now().strftime('%Y-%m-%d')}")
     print("="*40)
 
-    results = []
-    for index, token in enumerate(tokens, 1):
-        print(f"\n🔄 处理账号 {index}/{len(tokens)}")
-        signer = AliYunSigner(token)
+    calendar = SignCalendarCache(os.getenv("ALIYUN_CALENDAR_FILE", "aliyun_calendar.json"))
+
+    def handle(index, token):
+        print(f"\n🔄 处理账号 {index}")
+        signer = AliYunSigner(token, calendar)
         result = signer.process_sign()
         result["account"] = f"账号{index}"
+        if result["status"].startswith("✅"):
+            metrics.sign_result("success")
+        elif result["status"] == "⚠️ 重复签到":
+            metrics.sign_result("repeat")
+        else:
+            metrics.sign_result("failure")
         
         # 控制台输出
-        output = f"""
-🔔 阿里云签到结果（{result['account']}）
-├ 状态: {result['status']}
-├ 累计: {result['days']}天
-└ 时间: {result['time']}
-""".strip()
-        print(output)
-        results.append(result)
+        print(format_result(result))
+        return result
+
+    sink = ResultSink.for_site("aliyun")
+    try:
+        run_accounts(source, handle, sink, site="aliyun")
+    finally:
+        sink.close()
+        calendar.save()
+        timeouts.save()
+    print(f"\n📅 {calendar.summary()}")
 
     # 发送推送通知
-    if pushplus_token and results:
-        content = ""
-        for res in results:
-            content += f"""
-🔔 阿里云签到结果（{res['account']}）
-├ 状态: {res['status']}
-├ 累计: {res['days']}天
-└ 时间: {res['time']}
-"""
-        success = push_notification(pushplus_token, content.strip())
+    if pushplus_token and sink.total:
+        content = "\n\n".join(format_result(res) for res in sink.kept)
+        if sink.truncated:
+            content += f"\n\n…其余 {sink.truncated} 个账号结果见 {sink.path or '控制台输出'}"
+        success = push_notification(pushplus_token, content)
         print(f"\n📤 推送通知状态: {'成功' if success else '失败'}")
 
     print("\n🏁 所有账号处理完成")
 
 if __name__ == '__main__':
     start_time = datetime.now()
-    main()
+    metrics.start_run("aliyun")
+    try:
+        main()
+    finally:
+        metrics.finish_run()
     duration = (datetime.now() - start_time).total_seconds()
     print(f"\n## 执行结束 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}  耗时 {duration:.2f} 秒")
@@ -4,6 +4,8 @@ import requests
 import time
 from urllib.parse import unquote
 from datetime import datetime
+from timeouts import timeouts
+from metrics import metrics
 
 def get_env(name):
     value = os.getenv(name)
@@ -44,7 +46,7 @@ def create_session(cookies):
     cookies['rHEX_2132_lastact'] = f"{int(time.time())}%09home.php%09space"
     session.cookies.update(cookies)
     
-    waf_check = session.get('https://www.right.com.cn/FORUM/forum.php', timeout=10)
+    waf_check = timeouts.request(session, 'get', 'https://www.right.com.cn/FORUM/forum.php', default=10)
     if 'waf_verifying' in waf_check.text:
         raise RuntimeError("触发WAF验证，请更新Cookie")
     return session
@@ -109,16 +111,17 @@ def main():
         
         for method, path in actions:
             url = f'https://www.right.com.cn/FORUM/{path}'
-            res = getattr(session, method)(url, timeout=15)
+            res = timeouts.request(session, method, url, default=15)
             res.raise_for_status()
             time.sleep(1)
         
         # 获取积分信息
-        profile_res = session.get('https://www.right.com.cn/FORUM/home.php?mod=spacecp', timeout=15)
+        profile_res = timeouts.request(session, 'get', 'https://www.right.com.cn/FORUM/home.php?mod=spacecp', default=15)
         credits = extract_credits(profile_res.text)
         
         # 构建通知内容
         notification = format_notification("✅ 成功", credits)
+        metrics.sign_result("success")
         push_notification(notification)
         return notification
         
@@ -131,8 +134,14 @@ def main():
     except Exception as e:
         error_msg = format_notification(f"❌ 系统错误（{str(e)}）", 0)
     
+    metrics.sign_result("failure")
     push_notification(error_msg)
     return error_msg
 
 if __name__ == "__main__":
-    print(main())
+    metrics.start_run("enshan")
+    try:
+        print(main())
+    finally:
+        timeouts.save()
+        metrics.finish_run()
@@ -7,29 +7,31 @@
 1. 去除所有延迟，快速执行
 2. 优化结果解析逻辑
 3. 增强错误处理
+4. 缓存表单状态，命中时直接提交签到（HASHIQI_STATE_FILE 指定缓存文件，默认 hashiqi_state.json）
 """
 import os
 import time
+import hashlib
+import threading
 import requests
+from timeouts import timeouts
+from storage import load_json, save_json
+from metrics import metrics
+from accounts import AccountSource, ResultSink, run_accounts
 
 def load_config():
     """加载配置"""
     config = {
         "cookies": [],
-        "pushplus_token": os.getenv("PUSHPLUS_TOKEN", "").strip()
+        "pushplus_token": os.getenv("PUSHPLUS_TOKEN", "").strip(),
+        "form_cache": FormStateCache(os.getenv("HASHIQI_STATE_FILE", "hashiqi_state.json"))
     }
     
-    raw_cookies = os.getenv("HASHIQI_COOKIES", "")
-    if not raw_cookies:
+    config["cookies"] = AccountSource.load("HASHIQI_COOKIES", accept=lambda c: "ASP.NET_SessionId" in c)
+    if config["cookies"] is None:
         print("❌ 错误：未检测到HASHIQI_COOKIES环境变量")
         return None
     
-    config["cookies"] = [c.strip() for c in raw_cookies.splitlines() if c.strip() and "ASP.NET_SessionId" in c]
-    
-    if not config["cookies"]:
-        print("❌ 错误：没有有效的Cookie")
-        return None
-    
     return config
 
 def send_notification(title, content, token):
@@ -62,48 +64,162 @@ def create_session(cookie):
     })
     return session
 
-def do_sign(session):
-    """执行签到"""
+class FormStateCache:
+    """
+    按账号缓存上次可用的 __VIEWSTATE/__VIEWSTATEGENERATOR，命中时省去一次GET
+    超过 keep_days 天未使用的账号会被清理；保存时与文件中其他进程的记录合并，没有变化时不写入
+    """
+
+    def __init__(self, path, keep_days=7):
+        self.path = path
+        self.keep_days = keep_days
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._states = self._load()
+        self._changes = {}
+
+    @staticmethod
+    def key(cookie):
+        return hashlib.sha1(cookie.encode()).hexdigest()
+
+    def _load(self):
+        cutoff = time.strftime("%Y-%m-%d", time.localtime(time.time() - self.keep_days * 86400))
+        return {
+            key: entry for key, entry in load_json(self.path).items()
+            if isinstance(entry, dict) and entry.get("date", "") >= cutoff and entry.get("state")
+        }
+
+    def get(self, key):
+        with self._lock:
+            entry = self._states.get(key)
+            return entry["state"] if entry else None
+
+    def put(self, key, state):
+        """记录可用的表单状态；内容和日期都未变时不产生写入"""
+        entry = {"state": state, "date": time.strftime("%Y-%m-%d")}
+        with self._lock:
+            if self._states.get(key) != entry:
+                self._states[key] = entry
+                self._changes[key] = entry
+
+    def drop(self, key, rejected=True):
+        """rejected 表示服务端明确拒绝，此时本次运行多发了一次POST"""
+        with self._lock:
+            self._states.pop(key, None)
+            self._changes[key] = None
+            if rejected:
+                self.rejected += 1
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def save(self):
+        with self._lock:
+            changes, self._changes = self._changes, {}
+        if not changes:
+            return
+        merged = self._load()
+        for key, entry in changes.items():
+            if entry is None:
+                merged.pop(key, None)
+            else:
+                merged[key] = entry
+        save_json(self.path, merged, "表单缓存")
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        # 每次失效多发一次POST，抵消一次命中省下的GET
+        return f"表单缓存命中 {self.hits}/{total}（{rate:.0f}%），失效 {self.rejected} 次，净节省 {self.hits - self.rejected} 次请求"
+
+# ASP.NET 拒绝过期 ViewState 时的错误页特征
+VIEWSTATE_ERRORS = ("validation of viewstate mac failed", "invalid viewstate", "验证视图状态 mac 失败", "视图状态无效")
+
+def is_postback_rejected(response):
+    """缓存的表单状态是否被服务端明确拒绝"""
+    if response.status_code != 200:
+        return True
+    text = response.text.lower()
+    return any(marker in text for marker in VIEWSTATE_ERRORS)
+
+def parse_form_state(html):
+    """从签到页面解析表单参数"""
+    viewstate = html.split('id="__VIEWSTATE" value="')[1].split('"')[0] if '__VIEWSTATE' in html else ""
+    generator = html.split('id="__VIEWSTATEGENERATOR" value="')[1].split('"')[0] if '__VIEWSTATEGENERATOR' in html else ""
+    return {"__VIEWSTATE": viewstate, "__VIEWSTATEGENERATOR": generator}
+
+def post_sign(session, state):
+    """提交签到事件"""
+    post_data = dict(state, __EVENTTARGET="_lbtqd", __EVENTARGUMENT="")
+    return timeouts.request(
+        session, "post",
+        "https://vip.ioshashiqi.com/aspx3/mobile/qiandao.aspx",
+        default=20,
+        data=post_data
+    )
+
+def parse_sign_result(html):
+    """解析签到结果，无法解析时返回None"""
+    # 解析结果（新增多种匹配方式）
+    if 'id="lblprice"' in html:
+        return True, html.split('id="lblprice">')[1].split("<")[0].strip()
+    elif "今天已签到" in html:
+        return True, "今日已签到"
+    elif "签到成功" in html:
+        return True, "签到成功"
+    return None
+
+def do_sign(session, cache=None, key=None):
+    """执行签到（优先使用缓存的表单状态直接提交）"""
     try:
+        state = cache.get(key) if cache else None
+        if state:
+            sign_response = post_sign(session, state)
+            if "login.aspx" in sign_response.text.lower():
+                return False, "Cookie已失效"
+            if not is_postback_rejected(sign_response):
+                parsed = parse_sign_result(sign_response.text)
+                if parsed:
+                    cache.record(hit=True)
+                    cache.put(key, state)
+                    return parsed
+                # 服务端可能忽略了过期的ViewState；签到请求不能再提交一次，
+                # 丢弃缓存让下次运行重新获取表单
+                cache.drop(key, rejected=False)
+                cache.record(hit=False)
+                return False, "无法解析签到结果"
+            # 服务端拒绝了缓存的ViewState，回退到完整流程
+            cache.drop(key)
+        if cache:
+            cache.record(hit=False)
+        
         # 获取签到页面
         list_url = "https://vip.ioshashiqi.com/aspx3/mobile/qiandao.aspx?action=list"
-        response = session.get(list_url, timeout=15)
+        response = timeouts.request(session, "get", list_url, default=15)
         
         # 检查是否需要登录
         if "login.aspx" in response.text.lower():
             return False, "Cookie已失效"
         
         # 尝试解析表单
-        viewstate = response.text.split('id="__VIEWSTATE" value="')[1].split('"')[0] if '__VIEWSTATE' in response.text else ""
-        generator = response.text.split('id="__VIEWSTATEGENERATOR" value="')[1].split('"')[0] if '__VIEWSTATEGENERATOR' in response.text else ""
-        
-        if not viewstate:
+        state = parse_form_state(response.text)
+        if not state["__VIEWSTATE"]:
             return False, "无法获取表单参数"
         
         # 提交签到
-        post_data = {
-            "__VIEWSTATE": viewstate,
-            "__VIEWSTATEGENERATOR": generator,
-            "__EVENTTARGET": "_lbtqd",
-            "__EVENTARGUMENT": ""
-        }
-        
-        sign_response = session.post(
-            "https://vip.ioshashiqi.com/aspx3/mobile/qiandao.aspx",
-            data=post_data,
-            timeout=20
-        )
-        
-        # 解析结果（新增多种匹配方式）
-        if 'id="lblprice"' in sign_response.text:
-            result = sign_response.text.split('id="lblprice">')[1].split("<")[0].strip()
-            return True, result
-        elif "今天已签到" in sign_response.text:
-            return True, "今日已签到"
-        elif "签到成功" in sign_response.text:
-            return True, "签到成功"
-        else:
+        sign_response = post_sign(session, state)
+        parsed = parse_sign_result(sign_response.text)
+        if not parsed:
             return False, "无法解析签到结果"
+        if cache:
+            cache.put(key, state)
+        return parsed
             
     except Exception as e:
         return False, f"请求异常: {str(e)}"
@@ -118,22 +234,26 @@ def main():
     if not config:
         return
     
-    results = []
-    for idx, cookie in enumerate(config["cookies"], 1):
-        print(f"\n🔄 处理账号 {idx}/{len(config['cookies'])}")
+    def handle(idx, cookie):
+        print(f"\n🔄 处理账号 {idx}")
         
         try:
             session = create_session(cookie)
-            success, msg = do_sign(session)
+            success, msg = do_sign(session, config["form_cache"], FormStateCache.key(cookie))
             
             result = {
                 "account": idx,
                 "status": "成功" if success else "失败",
                 "message": msg
             }
-            results.append(result)
             
             print(f"✔️ 结果: {result['status']} - {msg}")
+            if not success:
+                metrics.sign_result("failure")
+            elif msg == "今日已签到":
+                metrics.sign_result("repeat")
+            else:
+                metrics.sign_result("success")
             
             # 发送单个账号通知
             if config["pushplus_token"]:
@@ -148,28 +268,49 @@ def main():
                     content=notification,
                     token=config["pushplus_token"]
                 )
+            return result
                 
         except Exception as e:
             print(f"❌ 发生异常: {str(e)}")
-            results.append({
+            metrics.sign_result("failure")
+            return {
                 "account": idx,
                 "status": "异常",
                 "message": str(e)
-            })
+            }
+    
+    sink = ResultSink.for_site("hashiqi")
+    try:
+        run_accounts(config["cookies"], handle, sink, site="hashiqi")
+    finally:
+        sink.close()
+        config["form_cache"].save()
+        timeouts.save()
+    print(f"\n📦 {config['form_cache'].summary()}")
+    
+    if not sink.total:
+        print("❌ 错误：没有有效的Cookie")
+        return
     
     # 发送汇总通知
-    if config["pushplus_token"] and results:
+    if config["pushplus_token"]:
         summary = "\n".join([
             f"账号{r['account']}: {r['status']} - {r['message']}" 
-            for r in results
+            for r in sink.kept
         ])
+        if sink.truncated:
+            summary += f"\n…其余 {sink.truncated} 个账号结果见 {sink.path or '控制台输出'}"
         send_notification(
-            title=f"哈士奇签到汇总（{len([r for r in results if r['status']=='成功'])}/{len(results)}成功）",
+            title=f"哈士奇签到汇总（{sink.counts.get('成功', 0)}/{sink.total}成功）",
             content=summary,
             token=config["pushplus_token"]
         )
 
 if __name__ == '__main__':
     start_time = time.time()
-    main()
+    metrics.start_run("hashiqi")
+    try:
+        main()
+    finally:
+        metrics.finish_run()
     print(f"\n🕒 总耗时: {time.time() - start_time:.2f}秒")
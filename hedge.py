@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+幂等读请求对冲（公共模块）
+更新时间：2026-10-19
+首个请求走调用方的会话，超过该接口历史p95仍未返回时用新的连接池再发一次，先返回者胜出；
+落败的请求无法中途取消，返回后直接断开、不读取响应体，也不计入延迟统计
+只能用于查询类请求，签到等有副作用的请求不得经过这里
+环境变量：
+QL_HEDGE        : 为1时启用对冲（可选）
+QL_HEDGE_BUDGET : 额外请求占可对冲请求数的上限比例，默认0.1（可选）
+"""
+import os
+import time
+import threading
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+import requests
+from timeouts import timeouts, endpoint_of
+from metrics import metrics
+
+
+def _background(fn, *args, **kwargs):
+    """在守护线程中执行，落败的请求不会拖住进程退出"""
+    future = Future()
+
+    def target():
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+def _clone(client):
+    """复制会话的请求头和Cookie到新的Session，使对冲请求走独立连接"""
+    session = requests.Session()
+    if isinstance(client, requests.Session):
+        session.headers = dict(client.headers)
+        session.cookies.update(client.cookies)
+    return session
+
+
+def _discard(future):
+    """关闭落败请求的响应；未读取的流式响应会直接断开连接"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class Hedger:
+    """按接口p95延迟触发对冲请求，并限制对冲带来的额外请求量"""
+
+    def __init__(self, enabled=False, budget=0.1, percentile=0.95, burst=1):
+        self.enabled = enabled
+        self.budget = budget
+        self.percentile = percentile
+        self.burst = burst
+        self.eligible = 0
+        self.fired = 0
+        self.won = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv("QL_HEDGE") == "1",
+            budget=float(os.getenv("QL_HEDGE_BUDGET", "0.1") or 0.1)
+        )
+
+    def _take_budget(self):
+        with self._lock:
+            if self.fired + 1 > self.burst + self.budget * self.eligible:
+                return False
+            self.fired += 1
+            return True
+
+    def request(self, client, method, url, default=15, **kwargs):
+        """与 timeouts.request 用法相同；未启用或没有延迟历史时直接发送"""
+        endpoint = endpoint_of(url)
+        delay = timeouts.quantile(endpoint, self.percentile) if self.enabled else None
+        if delay is None:
+            return timeouts.request(client, method, url, default=default, **kwargs)
+        with self._lock:
+            self.eligible += 1
+
+        # 两次尝试都以流式发送，胜负在收到响应头时决出，落败者的响应体不会被下载
+        kwargs["timeout"] = timeouts.timeout(endpoint, default)
+        kwargs["stream"] = True
+        started = {}
+        # 首个请求直接走调用方的会话，复用已有连接
+        primary = _background(getattr(client, method), url, **kwargs)
+        started[primary] = time.monotonic()
+        backup_client = None
+        done, _ = wait([primary], timeout=delay)
+        if not done and self._take_budget():
+            metrics.inc("ql_hedge_fired_total", endpoint=endpoint)
+            backup_client = _clone(client)
+            backup = _background(getattr(backup_client, method), url, **kwargs)
+            started[backup] = time.monotonic()
+
+        pending = set(started)
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        response = future.result()
+                        response.content  # 读完响应体，连接归还连接池
+                    except Exception as e:
+                        error = e
+                        continue
+                    if future is not primary:
+                        with self._lock:
+                            self.won += 1
+                        metrics.inc("ql_hedge_won_total", endpoint=endpoint)
+                        if isinstance(client, requests.Session):
+                            client.cookies.update(backup_client.cookies)
+                    # 只统计胜出请求自身的耗时；落败者返回后即被丢弃
+                    timeouts.observe(endpoint, time.monotonic() - started[future], response)
+                    for other in started:
+                        if other is not future:
+                            other.add_done_callback(_discard)
+                    return response
+            timeouts.observe(endpoint, time.monotonic() - started[primary])
+            raise error
+        finally:
+            if backup_client is not None:
+                backup_client.close()
+
+hedger = Hedger.from_env()
@@ -9,6 +9,9 @@ import time
 import requests
 import logging
 from typing import Optional, Dict, Any
+from timeouts import timeouts
+from hedge import hedger
+from metrics import metrics
 
 class QuarkSigner:
     def __init__(self):
@@ -73,7 +76,7 @@ class QuarkSigner:
         """检查登录状态"""
         url = "https://pan.quark.cn/account/info"
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
+            response = hedger.request(requests, "get", url, default=15, headers=self.headers)
             if response.status_code == 200:
                 return response.json()
             self.pretty_print(f"登录验证失败，状态码: {response.status_code}", is_error=True)
@@ -86,7 +89,7 @@ class QuarkSigner:
         """获取签到状态"""
         url = "https://drive-m.quark.cn/1/clouddrive/capacity/growth/info?pr=ucpro&fr=pc"
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
+            response = hedger.request(requests, "get", url, default=15, headers=self.headers)
             if response.status_code == 200:
                 return response.json()
             return None
@@ -122,11 +125,11 @@ class QuarkSigner:
         # 3. 执行签到
         url = "https://drive-m.quark.cn/1/clouddrive/capacity/growth/sign?pr=ucpro&fr=pc"
         try:
-            response = requests.post(
-                url,
+            response = timeouts.request(
+                requests, "post", url,
+                default=15,
                 headers=self.headers,
-                json={"sign_cyclic": True},
-                timeout=15
+                json={"sign_cyclic": True}
             )
             data = response.json()
 
@@ -159,8 +162,19 @@ if __name__ == '__main__':
         handlers=[logging.StreamHandler()]
     )
 
-    signer = QuarkSigner()
-    result = signer.do_sign()
+    metrics.start_run("quark")
+    try:
+        signer = QuarkSigner()
+        result = signer.do_sign()
+        if result["status"] != 200:
+            metrics.sign_result("failure")
+        elif result["message"] == "今日已签到":
+            metrics.sign_result("repeat")
+        else:
+            metrics.sign_result("success")
+    finally:
+        timeouts.save()
+        metrics.finish_run()
 
     # 构建输出内容
     status_icon = "✅" if result["status"] == 200 else "❌"
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标导出（公共模块），写成 Prometheus textfile 格式供 node_exporter 采集
+更新时间：2026-10-19
+环境变量：
+QL_METRICS_DIR  : node_exporter textfile 目录，设置后每次运行结束写入 ql_<站点>.prom（可选）
+"""
+import os
+import time
+import threading
+from storage import atomic_write
+
+# 请求延迟直方图桶上界（秒），timeouts.py 共用
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 20, 30, 60)
+
+SIGN_RESULTS = ("success", "repeat", "failure")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """进程内指标汇总：计数器、直方图和运行信息"""
+
+    def __init__(self):
+        self.site = "unknown"
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def start_run(self, site):
+        self.site = site
+        self._start = time.monotonic()
+        for result in SIGN_RESULTS:
+            self.inc("ql_sign_total", 0, result=result)
+        self.inc("ql_accounts_skipped_total", 0)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(dict(labels, site=self.site).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(dict(labels, site=self.site).items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist["counts"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def sign_result(self, result):
+        """记录一次签到结果：success / repeat / failure"""
+        self.inc("ql_sign_total", result=result if result in SIGN_RESULTS else "failure")
+
+    def observe_request(self, endpoint, seconds, sent=0, received=0):
+        self.observe("ql_request_duration_seconds", seconds, endpoint=endpoint)
+        self.inc("ql_transfer_bytes_total", sent, endpoint=endpoint, direction="tx")
+        self.inc("ql_transfer_bytes_total", received, endpoint=endpoint, direction="rx")
+
+    def render(self):
+        """生成 textfile 文本"""
+        types = {}
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        for (name, labels), value in counters:
+            if name not in types:
+                types[name] = "counter"
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), hist in histograms:
+            if name not in types:
+                types[name] = "histogram"
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(hist["buckets"], hist["counts"]):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {hist['sum']:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {hist['count']}")
+        site = _labels((("site", self.site),))
+        lines.append("# TYPE ql_run_duration_seconds gauge")
+        lines.append(f"ql_run_duration_seconds{site} {time.monotonic() - self._start:.3f}")
+        lines.append("# TYPE ql_last_run_timestamp_seconds gauge")
+        lines.append(f"ql_last_run_timestamp_seconds{site} {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def finish_run(self):
+        """运行结束时原子写入 textfile，未配置目录时跳过"""
+        directory = os.getenv("QL_METRICS_DIR", "").strip()
+        if not directory:
+            return
+        atomic_write(os.path.join(directory, f"ql_{self.site}.prom"), self.render(), "指标")
+
+
+metrics = Metrics()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按历史耗时调度账号（公共模块）
+更新时间：2026-10-19
+环境变量：
+QL_HISTORY_FILE     : 账号耗时记录路径，默认 ql_durations.json（可选）
+QL_SCHEDULE_WINDOW  : 每批参与排序的账号数，默认256（可选）
+QL_HISTORY_DAYS     : 账号超过多少天未出现即清理其耗时记录，默认30（可选）
+"""
+import os
+import time
+import heapq
+import hashlib
+import threading
+from storage import load_json, save_json
+
+# 没有任何历史时的预计耗时（秒）
+DEFAULT_DURATION = 5.0
+
+
+def account_key(credential):
+    """账号标识只保存凭据摘要"""
+    return hashlib.sha1(credential.encode()).hexdigest()[:16]
+
+
+class DurationHistory:
+    """
+    记录每个账号最近的执行耗时（指数平滑）及最后出现的日期，
+    超过保留天数未出现的账号会被清理，每个站点最多保留 max_entries 个账号
+    """
+
+    def __init__(self, path, alpha=0.5, keep_days=30, max_entries=100000):
+        self.path = path
+        self.alpha = alpha
+        self.keep_days = keep_days
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = self._load()
+        # 每个站点的 [耗时总和, 账号数]，新账号预测时不必遍历全部记录
+        self._sums = {
+            site: [sum(entry[0] for entry in durations.values()), len(durations)]
+            for site, durations in self._data.items()
+        }
+        self._updates = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("QL_HISTORY_FILE", "ql_durations.json"),
+            keep_days=int(os.getenv("QL_HISTORY_DAYS", "30") or 30)
+        )
+
+    @staticmethod
+    def _today():
+        return int(time.time() // 86400)
+
+    def _prune(self, durations):
+        """清理过期账号，超出上限时按最后出现日期保留最近的账号"""
+        cutoff = self._today() - self.keep_days
+        kept = {key: entry for key, entry in durations.items() if entry[1] >= cutoff}
+        if len(kept) > self.max_entries:
+            recent = sorted(kept.items(), key=lambda item: item[1][1], reverse=True)[:self.max_entries]
+            kept = dict(recent)
+        return kept
+
+    def _load(self):
+        data = load_json(self.path)
+        today = self._today()
+        loaded = {}
+        for site, durations in data.items():
+            if not isinstance(durations, dict):
+                continue
+            # 兼容只保存耗时的旧格式
+            entries = {
+                key: value if isinstance(value, list) else [value, today]
+                for key, value in durations.items()
+            }
+            loaded[site] = self._prune(entries)
+        return loaded
+
+    def predict(self, site, key):
+        """已知账号用历史耗时，新账号用该站点平均值"""
+        with self._lock:
+            entry = self._data.get(site, {}).get(key)
+            if entry is not None:
+                return entry[0]
+            total, count = self._sums.get(site, (0.0, 0))
+            if count:
+                return total / count
+        return DEFAULT_DURATION
+
+    def record(self, site, key, seconds):
+        with self._lock:
+            durations = self._data.setdefault(site, {})
+            sums = self._sums.setdefault(site, [0.0, 0])
+            old = durations.get(key)
+            if old is None:
+                value = seconds
+                sums[1] += 1
+            else:
+                value = self.alpha * seconds + (1 - self.alpha) * old[0]
+                sums[0] -= old[0]
+            sums[0] += value
+            entry = [value, self._today()]
+            durations[key] = entry
+            self._updates.setdefault(site, {})[key] = entry
+
+    def save(self):
+        """合并其他脚本同时写入的记录并清理过期账号后原子保存"""
+        with self._lock:
+            updates, self._updates = self._updates, {}
+        if not updates:
+            return
+        merged = self._load()
+        for site, durations in updates.items():
+            merged[site] = self._prune(dict(merged.get(site, {}), **durations))
+        save_json(self.path, merged, "耗时记录")
+
+
+class Scheduler:
+    """
+    最长任务优先（LPT）分配账号，同时限制单个站点同时占用的线程数，
+    让多个站点的请求交错进行；分批调用 plan，预计总耗时跨批次累计
+    """
+
+    def __init__(self, workers, history, per_site=None):
+        self.workers = workers
+        self.history = history
+        self.per_site = per_site
+        self._free = [0.0] * workers
+        self._running = []  # (结束时间, 站点)
+
+    def plan(self, jobs):
+        """jobs 为 (站点, 凭据, 附带数据) 列表，返回按派发顺序排好的同类列表"""
+        remaining = sorted(
+            ((self.history.predict(site, account_key(cred)), site, cred, extra) for site, cred, extra in jobs),
+            key=lambda job: -job[0]
+        )
+        sites = {job[1] for job in remaining}
+        cap = self.per_site or max(1, -(-self.workers // max(len(sites), 1)))
+        order = []
+        while remaining:
+            start = heapq.heappop(self._free)
+            self._running = [(end, site) for end, site in self._running if end > start]
+            busy = {}
+            for _, site in self._running:
+                busy[site] = busy.get(site, 0) + 1
+            pick = next((i for i, job in enumerate(remaining) if busy.get(job[1], 0) < cap), None)
+            if pick is None:
+                # 所有站点都已占满，等到最早结束的任务之后再派发
+                heapq.heappush(self._free, min(end for end, _ in self._running))
+                continue
+            predicted, site, cred, extra = remaining.pop(pick)
+            heapq.heappush(self._free, start + predicted)
+            self._running.append((start + predicted, site))
+            order.append((site, cred, extra))
+        return order
+
+    @property
+    def predicted_makespan(self):
+        return max(self._free)
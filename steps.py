@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+账号内请求步骤图（公共模块）
+更新时间：2026-10-19
+每个步骤声明依赖的步骤名，互不依赖的步骤并发执行，依赖就绪后立即开始
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class StepGraph:
+    """按数据依赖调度签到步骤"""
+
+    def __init__(self):
+        self._steps = {}
+
+    def step(self, name, fn, needs=()):
+        """注册步骤；fn 以依赖步骤的结果作为同名关键字参数调用"""
+        for dep in needs:
+            if dep not in self._steps:
+                raise ValueError(f"步骤 {name} 依赖未注册的步骤 {dep}")
+        self._steps[name] = (fn, tuple(needs))
+        return self
+
+    def run(self):
+        """执行全部步骤并返回 {步骤名: 结果}；任一步骤出错时不再启动新步骤并抛出该异常"""
+        results = {}
+        pending = dict(self._steps)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as executor:
+            while pending or running:
+                if error is None:
+                    for name, (fn, needs) in list(pending.items()):
+                        if all(dep in results for dep in needs):
+                            kwargs = {dep: results[dep] for dep in needs}
+                            # 步骤在调用方的上下文中执行（如按账号收集的日志）
+                            ctx = contextvars.copy_context()
+                            running[executor.submit(ctx.run, fn, **kwargs)] = name
+                            del pending[name]
+                elif not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+        if error is not None:
+            raise error
+        return results
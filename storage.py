@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行状态文件读写（公共模块）
+更新时间：2026-10-19
+写入先落到带进程号的临时文件再替换，失败时只打印提示，不影响签到结果
+"""
+import os
+import json
+
+
+def load_json(path):
+    """读取JSON状态文件，不存在或内容损坏时返回空字典"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def atomic_write(path, text, label):
+    """原子写入文本，返回是否成功"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        print(f"⚠️ {label}保存失败: {str(e)}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def save_json(path, data, label):
+    return atomic_write(path, json.dumps(data, ensure_ascii=False), label)
@@ -7,20 +7,28 @@
 """
 
 import requests
-import re
 import os
 import json
+import contextvars
 from datetime import datetime
+from timeouts import timeouts
+from hedge import hedger
+from metrics import metrics
+from steps import StepGraph
+from accounts import AccountSource, ResultSink, run_accounts
 
 # 初始化日志
 print('============📣初始化📣============')
 version = '1.46.8'
 all_print_list = []
+# 处理账号期间的日志写入该账号自己的列表，随结果交给 ResultSink
+account_log = contextvars.ContextVar("account_log", default=None)
 
 def myprint(msg):
     """打印并记录日志"""
     print(msg)
-    all_print_list.append(f"{msg}\n")
+    lines = account_log.get()
+    (all_print_list if lines is None else lines).append(f"{msg}\n")
 
 def months_between_dates(d1):
     """计算两个日期之间的月份差"""
@@ -77,11 +85,12 @@ def get_activity_id(ck):
     }
     
     try:
-        response = requests.post(
+        response = hedger.request(
+            requests, 'post',
             'https://sss-web.tastientech.com/api/minic/shop/intelligence/banner/c/list',
+            default=15,
             json=data,
-            headers=headers,
-            timeout=15
+            headers=headers
         )
         result = response.json()
         
@@ -105,9 +114,44 @@ def get_activity_id(ck):
     myprint(f"🔢 使用计算的活动ID: {calculated_id}")
     return calculated_id
 
+def submit_sign(headers, activity_id, user_info):
+    """提交签到"""
+    if user_info.get('code') != 200:
+        myprint(f"❌ 登录失败: {user_info.get('msg', '未知错误')}")
+        return "failure"
+    
+    phone = user_info.get('result', {}).get('phone', '未知号码')
+    myprint(f"📱 账号: {phone}")
+    
+    # 执行签到
+    sign_data = {
+        "activityId": activity_id,
+        "memberName": "",
+        "memberPhone": phone
+    }
+    sign_result = timeouts.request(
+        requests, 'post',
+        'https://sss-web.tastientech.com/api/sign/member/signV2',
+        default=15,
+        json=sign_data,
+        headers=headers
+    ).json()
+    
+    if sign_result.get('code') == 200:
+        reward = sign_result.get('result', {}).get('rewardInfoList', [{}])[0]
+        if reward.get('rewardName'):
+            myprint(f"🎉 签到成功！获得: {reward['rewardName']}")
+        else:
+            myprint(f"🎉 签到成功！获得: {reward.get('point', '未知')}积分")
+        return "success"
+    elif '已签到' in str(sign_result.get('msg', '')):
+        myprint(f"⚠️ 重复签到: {sign_result.get('msg')}")
+        return "repeat"
+    myprint(f"❌ 签到失败: {sign_result.get('msg', '未知错误')}")
+    return "failure"
+
 def do_sign_in(ck):
-    """执行签到操作"""
-    activity_id = get_activity_id(ck)
+    """执行签到操作（活动ID与用户信息并发获取）"""
     headers = {
         'user-token': ck,
         'version': version,
@@ -116,68 +160,65 @@ def do_sign_in(ck):
     }
     
     try:
+        graph = StepGraph()
+        graph.step("activity_id", lambda: get_activity_id(ck))
         # 获取用户信息
-        user_info = requests.get(
+        graph.step("user_info", lambda: hedger.request(
+            requests, 'get',
             'https://sss-web.tastientech.com/api/intelligence/member/getMemberDetail',
-            headers=headers,
-            timeout=15
-        ).json()
-        
-        if user_info.get('code') != 200:
-            myprint(f"❌ 登录失败: {user_info.get('msg', '未知错误')}")
-            return
-        
-        phone = user_info.get('result', {}).get('phone', '未知号码')
-        myprint(f"📱 账号: {phone}")
-        
-        # 执行签到
-        sign_data = {
-            "activityId": activity_id,
-            "memberName": "",
-            "memberPhone": phone
-        }
-        sign_result = requests.post(
-            'https://sss-web.tastientech.com/api/sign/member/signV2',
-            json=sign_data,
-            headers=headers,
-            timeout=15
-        ).json()
-        
-        if sign_result.get('code') == 200:
-            reward = sign_result.get('result', {}).get('rewardInfoList', [{}])[0]
-            if reward.get('rewardName'):
-                myprint(f"🎉 签到成功！获得: {reward['rewardName']}")
-            else:
-                myprint(f"🎉 签到成功！获得: {reward.get('point', '未知')}积分")
-        else:
-            myprint(f"❌ 签到失败: {sign_result.get('msg', '未知错误')}")
-            
+            default=15,
+            headers=headers
+        ).json())
+        graph.step(
+            "sign",
+            lambda activity_id, user_info: submit_sign(headers, activity_id, user_info),
+            needs=("activity_id", "user_info")
+        )
+        return graph.run()["sign"]
     except Exception as e:
         myprint(f"❌ 签到过程出错: {str(e)}")
+    return "failure"
 
 def main():
     """主函数"""
     # 获取账号列表
-    if 'tsthbck' in os.environ:
-        accounts = re.split("@|&", os.environ.get("tsthbck"))
-        myprint(f"📊 找到 {len(accounts)} 个账号")
-    else:
+    accounts = AccountSource.load("tsthbck", sep="@|&")
+    if accounts is None:
         myprint("⚠️ 未找到tsthbck环境变量")
         return
     
     # 处理每个账号
-    for idx, account in enumerate(accounts, 1):
-        if not account.strip():
-            continue
-            
-        myprint(f"\n🔔 处理第 {idx} 个账号")
-        myprint("----------------------")
-        do_sign_in(account.strip())
-        myprint("----------------------")
+    def handle(idx, account):
+        lines = []
+        status = "failure"
+        token = account_log.set(lines)
+        try:
+            myprint(f"\n🔔 处理第 {idx} 个账号")
+            myprint("----------------------")
+            status = do_sign_in(account)
+            metrics.sign_result(status)
+            myprint("----------------------")
+        finally:
+            account_log.reset(token)
+        return {"account": idx, "status": status, "message": "".join(lines)}
+    
+    sink = ResultSink.for_site("tastien")
+    try:
+        run_accounts(accounts, handle, sink, site="tastien")
+    finally:
+        sink.close()
+        timeouts.save()
+    
+    # 推送中只保留前若干个账号的日志
+    all_print_list.extend(r["message"] for r in sink.kept)
+    if sink.truncated:
+        myprint(f"\n…其余 {sink.truncated} 个账号结果见 {sink.path or '控制台输出'}")
+    myprint(f"📊 共处理 {sink.total} 个账号")
 
 if __name__ == '__main__':
     try:
         myprint("\n🟢 开始执行签到任务")
+        metrics.start_run("tastien")
         main()
         myprint("\n🟢 任务执行完成")
         
@@ -188,4 +229,5 @@ if __name__ == '__main__':
     except Exception as e:
         myprint(f"\n❌ 程序运行出错: {str(e)}")
     finally:
+        metrics.finish_run()
         myprint("\n⏱️ 脚本执行结束")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按接口自适应超时（公共模块）
+更新时间：2026-10-19
+环境变量：
+QL_LATENCY_FILE : 延迟直方图保存路径，默认 ql_latency.json（可选）
+"""
+import os
+import time
+import threading
+from urllib.parse import urlsplit
+from metrics import metrics, LATENCY_BUCKETS
+from storage import load_json, save_json
+
+# 直方图桶上界（秒），最后一个桶收纳所有更慢的请求
+BUCKETS = LATENCY_BUCKETS
+
+
+def endpoint_of(url):
+    """接口标识：主机+路径，忽略查询参数"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+class AdaptiveTimeouts:
+    """记录每个接口的延迟分布，按高分位数加余量给出连接/读取超时"""
+
+    def __init__(self, path, percentile=0.99, margin=1.5, floor=(1.0, 2.0),
+                 ceiling=(10.0, 30.0), min_samples=20, max_samples=1000):
+        self.path = path
+        self.percentile = percentile
+        self.margin = margin
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._hist = self._load()
+        self._delta = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("QL_LATENCY_FILE", "ql_latency.json"))
+
+    def _load(self):
+        data = load_json(self.path)
+        return {k: v for k, v in data.items() if isinstance(v, list) and len(v) == len(BUCKETS)}
+
+    def record(self, endpoint, seconds):
+        index = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS) - 1)
+        with self._lock:
+            for hist in (self._hist, self._delta):
+                hist.setdefault(endpoint, [0] * len(BUCKETS))[index] += 1
+
+    def quantile(self, endpoint, q):
+        """返回分位数所在桶的上界，样本不足时返回None"""
+        with self._lock:
+            counts = list(self._hist.get(endpoint, ()))
+        total = sum(counts)
+        if total < self.min_samples:
+            return None
+        target = q * total
+        seen = 0
+        for bound, count in zip(BUCKETS, counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return BUCKETS[-1]
+
+    def timeout(self, endpoint, default):
+        """返回 (连接超时, 读取超时)；没有足够历史时沿用脚本原先的固定值"""
+        observed = self.quantile(endpoint, self.percentile)
+        if observed is None:
+            return (min(default, self.ceiling[0]), default)
+        value = observed * self.margin
+        return tuple(min(max(value, lo), hi) for lo, hi in zip(self.floor, self.ceiling))
+
+    def request(self, client, method, url, default=15, **kwargs):
+        """通过 client（Session 或 requests 模块）发送请求并记录耗时"""
+        endpoint = endpoint_of(url)
+        kwargs["timeout"] = self.timeout(endpoint, default)
+        start = time.monotonic()
+        try:
+            response = getattr(client, method)(url, **kwargs)
+        except Exception:
+            # 超时或连接失败按实际等待时间计入，使过短的超时在下次自动放宽
+            self.observe(endpoint, time.monotonic() - start)
+            raise
+        self.observe(endpoint, time.monotonic() - start, response)
+        return response
+
+    def observe(self, endpoint, seconds, response=None):
+        """计入一次请求的耗时，并把耗时和收发字节数交给指标导出"""
+        self.record(endpoint, seconds)
+        if response is None:
+            metrics.observe_request(endpoint, seconds)
+            return
+        body = getattr(response.request, "body", None) or b""
+        if isinstance(body, str):
+            body = body.encode()
+        metrics.observe_request(endpoint, seconds, sent=len(body), received=len(response.content))
+
+    def save(self):
+        """合并其他脚本同时写入的数据后原子保存"""
+        with self._lock:
+            delta, self._delta = self._delta, {}
+        if not delta:
+            return
+        merged = self._load()
+        for endpoint, counts in delta.items():
+            base = merged.setdefault(endpoint, [0] * len(BUCKETS))
+            for i, count in enumerate(counts):
+                base[i] += count
+            # 样本过多时减半，让分布跟随接口近期表现；向上取整，
+            # 否则只有一个样本的慢尾部桶会被清零，p99 随之塌向下限
+            while sum(base) > self.max_samples:
+                base[:] = [(c + 1) // 2 for c in base]
+        save_json(self.path, merged, "延迟记录")
+
+
+timeouts = AdaptiveTimeouts.from_env()